@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+JARファイル内の言語ファイルを走査する共通処理
+
+tranlator.py（スキャン）と translator_advance.py（翻訳）の両方から使う
+"""
+
+import os
+import zipfile
+import json
+from pathlib import Path
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    # スキャンだけならorjsonは不要なので、無い場合は標準のjsonで読み込む
+    json_loads = json.loads
+
+UTF8_BOM = b'\xef\xbb\xbf'
+
+def list_jar_files(directory_path):
+    """
+    ディレクトリ直下のJARファイルのパスを列挙する（ディレクトリでなければ空のリスト）
+    """
+    if not os.path.isdir(directory_path):
+        return []
+    # DirEntryはファイル種別をキャッシュしているので、エントリごとのstatが不要（シンボリックリンクは辿る）
+    # パスは従来の Path(directory_path).glob("*.jar") と同じ表記にする（'.' なら 'a.jar'、'./a.jar' にしない）
+    # 拡張子は大文字・小文字を区別しない（Windowsでのglobと同じく Foo.JAR も対象にする）
+    return [str(Path(directory_path, entry.name)) for entry in os.scandir(directory_path)
+            if entry.name.lower().endswith('.jar') and entry.is_file()]
+
+def split_lang_path(file_path):
+    """
+    .jsonで終わるパスを (MOD ID, 言語コード) に分解する（言語ファイルでなければ None）
+    """
+    # assets/modid/lang/xx_xx.json または data/modid/lang/xx_xx.json を1回の分割で判定・抽出
+    parts = file_path.rsplit('/', 3)
+    if (len(parts) == 4 and parts[0].lower() in ('assets', 'data') and parts[1]
+            and parts[2].lower() == 'lang' and len(parts[3]) > 5):
+        return parts[1], parts[3][:-5]
+    return None
+
+def sibling_ja_jp_path(en_us_path):
+    """
+    en_us.json のパスから、同じフォルダの ja_jp.json のパスを作る
+    """
+    # ファイル名の大文字・小文字に関わらずフォルダ部分だけを使う
+    return en_us_path.rsplit('/', 1)[0] + '/ja_jp.json'
+
+def looks_like_json(jar, file_info):
+    """
+    ファイルの先頭だけを展開し、JSONらしいか（{ または [ で始まるか）を判定する
+    """
+    with jar.open(file_info) as f:
+        head = f.read(64)
+    # BOMと先頭の空白を除いた最初の1バイトで判定
+    head = head.removeprefix(UTF8_BOM).lstrip()
+    return head[:1] in (b'{', b'[')
+
+def iter_lang_entries(jar_path, only_en_us=False, load_content=False, skip_translated=False):
+    """
+    JARファイル内の言語ファイルの情報を順に返す
+    
+    only_en_us=True なら en_us.json のみを対象にする。
+    skip_translated=True なら同じフォルダに ja_jp.json が既にあるファイルを除外する。
+    load_content=True なら内容をJSONとして読み込んで 'content' に、圧縮方式を 'compress_type' に格納し、
+    解析できないファイルやJSONオブジェクトでないファイルは除外する（圧縮方式は翻訳結果を書き込む際に、JARを走査し直さずに使うため）。
+    load_content=False なら先頭の数バイトだけでJSONらしいファイルに絞り込む。
+    JARファイルが壊れている場合などの例外はそのまま送出する。
+    """
+    suffix = 'en_us.json' if only_en_us else '.json'
+    
+    with zipfile.ZipFile(jar_path, 'r') as jar:
+        # ja_jp.json の有無はエントリごとに調べるので、名前の集合はJARごとに1回だけ作る
+        names = set(jar.namelist()) if skip_translated else None
+        for file_info in jar.filelist:
+            file_path = file_info.filename
+            
+            # 言語ファイルのパターン: assets/*/lang/*.json（MODによっては data/*/lang/*.json）
+            # エントリの大半は .class などなので、まずファイル名の末尾だけで除外する
+            if file_path[-len(suffix):].lower() != suffix:
+                continue
+            
+            lang_path = split_lang_path(file_path)
+            if not lang_path:
+                continue
+            mod_id, lang_code = lang_path
+            if only_en_us and lang_code.lower() != 'en_us':
+                continue
+            if skip_translated and sibling_ja_jp_path(file_path) in names:
+                continue
+            
+            # 一覧に必要な情報はZIPのセントラルディレクトリだけで揃う
+            lang_file = {
+                'path': file_path,
+                'size': file_info.file_size,
+                'mod_id': mod_id,
+                'lang_code': lang_code
+            }
+            
+            if load_content:
+                try:
+                    # バイト列のまま解析する（BOM付きのファイルのみBOMを除去）
+                    content = json_loads(jar.read(file_info).removeprefix(UTF8_BOM))
+                except ValueError:
+                    # JSONDecodeError（orjson・標準json共通）も、標準jsonが不正なUTF-8で送出する
+                    # UnicodeDecodeErrorもValueErrorのサブクラス
+                    continue
+                # 言語ファイルはキーと文字列の組のオブジェクトなので、配列などは解析できないものと同じく除外する
+                if not isinstance(content, dict):
+                    continue
+                lang_file['content'] = content
+                lang_file['compress_type'] = file_info.compress_type
+            elif not looks_like_json(jar, file_info):
+                continue
+            
+            yield lang_file
@@ -8,79 +8,61 @@ Created on Sun Aug  3 02:36:40 2025
 import os
 import zipfile
 import json
-from pathlib import Path
-import re
+from concurrent.futures import ThreadPoolExecutor
+from jar_scan import iter_lang_entries, json_loads, list_jar_files
+
+# JARごとの (mtime, サイズ, 言語ファイル一覧) を保存するスキャンキャッシュ
+SCAN_CACHE_FILE = ".scan_cache.json"
 
 def find_language_files_in_jar(jar_path):
     """
-    JARファイル内の言語ファイルを検索する
-    """
-    language_files = []
+    JARファイル内の言語ファイルを検索し、(言語ファイルの一覧, エラーメッセージ) を返す
     
+    読み込めなかった場合は一覧が None になる。並列のワーカーから呼ばれるので、
+    メッセージはここでは表示せず、呼び出し側がJARの順序どおりに表示する。
+    """
     try:
-        with zipfile.ZipFile(jar_path, 'r') as jar:
-            # JARファイル内の全ファイルをチェック
-            for file_info in jar.filelist:
-                file_path = file_info.filename
-                
-                # 言語ファイルのパターンをチェック
-                # 一般的なパターン: assets/*/lang/*.json
-                # MODによっては data/*/lang/*.json の場合もある
-                lang_pattern = re.compile(r'(assets|data)/[^/]+/lang/[^/]+\.json$', re.IGNORECASE)
-                
-                if lang_pattern.match(file_path):
-                    # ファイルの内容を確認（JSONかどうか）
-                    try:
-                        content = jar.read(file_info).decode('utf-8')
-                        # JSONとして解析可能かチェック
-                        json.loads(content)
-                        
-                        language_files.append({
-                            'path': file_path,
-                            'size': file_info.file_size,
-                            'mod_id': extract_mod_id(file_path),
-                            'lang_code': extract_lang_code(file_path)
-                        })
-                    except (UnicodeDecodeError, json.JSONDecodeError):
-                        # JSONでない場合はスキップ
-                        continue
+        # スキャンでは内容を使わないので全体の展開・解析はしない
+        return list(iter_lang_entries(jar_path)), None
                         
     except zipfile.BadZipFile:
-        print(f"警告: {jar_path} は有効なJARファイルではありません")
+        return None, f"警告: {jar_path} は有効なJARファイルではありません"
     except Exception as e:
-        print(f"エラー: {jar_path} の処理中にエラーが発生しました: {e}")
-    
-    return language_files
+        return None, f"エラー: {jar_path} の処理中にエラーが発生しました: {e}"
 
-def extract_mod_id(file_path):
+def load_scan_cache(cache_path=SCAN_CACHE_FILE):
     """
-    ファイルパスからMOD IDを抽出
+    前回のスキャン結果のキャッシュを読み込む
     """
-    # assets/modid/lang/... または data/modid/lang/... からmodidを抽出
-    parts = file_path.split('/')
-    if len(parts) >= 3 and parts[1]:
-        return parts[1]
-    return "unknown"
+    try:
+        # 文字列に変換せず、バイト列のまま解析する
+        with open(cache_path, 'rb') as f:
+            cache = json_loads(f.read())
+    except (OSError, ValueError):
+        # キャッシュが無い・壊れている場合は全JARをスキャンし直す
+        return {}
+    # JSONとしては正しくても形が違う場合は、キャッシュが無いものとして扱う
+    return cache if isinstance(cache, dict) else {}
 
-def extract_lang_code(file_path):
+def save_scan_cache(cache, cache_path=SCAN_CACHE_FILE):
     """
-    ファイルパスから言語コードを抽出
+    スキャン結果のキャッシュを保存する
     """
-    filename = os.path.basename(file_path)
-    # .jsonを除去して言語コードを取得
-    return os.path.splitext(filename)[0]
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"警告: スキャンキャッシュを保存できませんでした: {e}")
 
 def scan_directory_for_mods(directory_path):
     """
     指定されたディレクトリ内のすべてのJARファイルをスキャン
     """
-    directory = Path(directory_path)
-    
-    if not directory.exists():
+    if not os.path.exists(directory_path):
         print(f"エラー: ディレクトリ {directory_path} が存在しません")
         return {}
     
-    jar_files = list(directory.glob("*.jar"))
+    jar_files = list_jar_files(directory_path)
     
     if not jar_files:
         print(f"警告: {directory_path} にJARファイルが見つかりません")
@@ -90,12 +72,48 @@ def scan_directory_for_mods(directory_path):
     
     all_results = {}
     
+    # 前回から更新日時とサイズが変わっていないJARはキャッシュの結果を使い、開き直さない
+    cache = load_scan_cache()
+    new_cache = {}
+    jar_to_scan = []
+    for jar_file in jar_files:
+        stat = os.stat(jar_file)
+        cached = cache.get(jar_file)
+        # 形の違うエントリ（古い形式や手で編集されたものなど）は使わずにスキャンし直す
+        if (isinstance(cached, dict) and isinstance(cached.get('language_files'), list)
+                and cached.get('mtime_ns') == stat.st_mtime_ns and cached.get('size') == stat.st_size):
+            new_cache[jar_file] = cached
+        else:
+            new_cache[jar_file] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+            jar_to_scan.append(jar_file)
+    
+    if len(jar_to_scan) < len(jar_files):
+        print(f"前回から変更のない{len(jar_files) - len(jar_to_scan)}個のJARファイルはキャッシュを使用します")
+    
+    # 各JARの読み込みは独立しているので並列に行い、表示は（エラーも含めて）元の順序でまとめて行う
+    errors = {}
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        scanned = executor.map(find_language_files_in_jar, jar_to_scan)
+        for jar_file, (language_files, error) in zip(jar_to_scan, scanned):
+            if error:
+                errors[jar_file] = error
+            if language_files is None:
+                # 読み込めなかったJARはキャッシュせず、次回もスキャンし直す
+                del new_cache[jar_file]
+            else:
+                new_cache[jar_file]['language_files'] = language_files
+    
+    save_scan_cache(new_cache)
+    
     for jar_file in jar_files:
-        print(f"\n処理中: {jar_file.name}")
-        language_files = find_language_files_in_jar(jar_file)
+        language_files = new_cache[jar_file]['language_files'] if jar_file in new_cache else None
+        print(f"\n処理中: {os.path.basename(jar_file)}")
+        if jar_file in errors:
+            print(errors[jar_file])
         
         if language_files:
-            all_results[str(jar_file)] = language_files
+            all_results[jar_file] = language_files
             print(f"  {len(language_files)}個の言語ファイルを発見")
             
             # 詳細情報を表示
@@ -1,75 +1,29 @@
 import os
 import zipfile
-import json
-import time
-from pathlib import Path
+import orjson
+import hashlib
+import importlib.util
+import logging
+import queue
 import re
-from typing import Dict, List, Optional
+import shelve
+import shutil
+import time
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+import httpx
 from google import genai
+from jar_scan import iter_lang_entries, list_jar_files, sibling_ja_jp_path
 
-class ModTranslator:
-    def __init__(self, gemini_api_key: str):
-        self.api_key = gemini_api_key
-        # 新しいGemini SDKクライアントを初期化
-        self.client = genai.Client(api_key=gemini_api_key)
-        self.translation_delay = 1  # API呼び出し間の遅延（秒）
-    
-    def find_language_files_in_jar(self, jar_path: str) -> List[Dict]:
-        """JARファイル内のen_us言語ファイルのみを検索する"""
-        language_files = []
-        
-        try:
-            with zipfile.ZipFile(jar_path, 'r') as jar:
-                for file_info in jar.filelist:
-                    file_path = file_info.filename
-                    
-                    # en_us.jsonファイルのみを対象とする
-                    lang_pattern = re.compile(r'(assets|data)/[^/]+/lang/en_us\.json$', re.IGNORECASE)
-                    
-                    if lang_pattern.match(file_path):
-                        try:
-                            content = jar.read(file_info).decode('utf-8')
-                            json_data = json.loads(content)
-                            
-                            language_files.append({
-                                'path': file_path,
-                                'content': json_data,
-                                'mod_id': self.extract_mod_id(file_path),
-                                'lang_code': self.extract_lang_code(file_path)
-                            })
-                        except (UnicodeDecodeError, json.JSONDecodeError):
-                            continue
-                            
-        except zipfile.BadZipFile:
-            print(f"警告: {jar_path} は有効なJARファイルではありません")
-        except Exception as e:
-            print(f"エラー: {jar_path} の処理中にエラーが発生しました: {e}")
-        
-        return language_files
-    
-    def extract_mod_id(self, file_path: str) -> str:
-        """ファイルパスからMOD IDを抽出"""
-        parts = file_path.split('/')
-        if len(parts) >= 3 and parts[1]:
-            return parts[1]
-        return "unknown"
-    
-    def extract_lang_code(self, file_path: str) -> str:
-        """ファイルパスから言語コードを抽出"""
-        filename = os.path.basename(file_path)
-        return os.path.splitext(filename)[0]
-    
-    def translate_json_with_gemini(self, json_data: Dict, source_lang: str = "English") -> Optional[Dict]:
-        """Gemini APIを使ってJSONデータを翻訳"""
-        try:
-            # JSONを文字列として整形
-            json_str = json.dumps(json_data, ensure_ascii=False, indent=2)
-            
-            # DarkRPG専用プロンプトを作成
-            prompt = f"""以下はMinecraftのDarkRPGモッドパックの言語ファイル（JSON形式）です。
-このJSONの値部分のみを英語から日本語に翻訳してください。
-キー部分は変更しないでください。
-翻訳後のJSONのみを返してください。説明文は不要です。
+logger = logging.getLogger('modtranslate')
+
+# DarkRPG専用プロンプト（翻訳対象の番号付きリストをこの後ろに連結する）
+PROMPT_HEADER = """以下はMinecraftのDarkRPGモッドパックの言語ファイルから取り出した翻訳対象のテキストです。
+1行に1項目で、行頭の数字は1から始まる項目番号です。
+各項目を英語から日本語に翻訳し、「番号. 翻訳文」の形式で全項目を返してください。説明文は不要です。
 
 DarkRPG翻訳ルール:
 - 世界観：ダークファンタジー、吸血鬼、ドラゴン、魔法、ダークソウル風の重厚な雰囲気
@@ -80,7 +34,7 @@ DarkRPG翻訳ルール:
 - 吸血鬼要素：「血族」「夜の子」「血の渇き」など独特の表現
 - 口調：格調高く、やや古風で重厚感のある日本語
 - 固有名詞：英語のままでも可、ただし雰囲気に合わせてカタカナ化も検討
-- JSONの構造とキーは絶対に変更しない
+- 項目番号は絶対に変更せず、1つの項目を複数行に分けない（\\n・\\r・\\uXXXX は改行などの制御文字、\\\\ は \\ を表すのでそのまま残す）
 
 翻訳例：
 "Cursed Blade" → "呪われし刃"
@@ -89,9 +43,207 @@ DarkRPG翻訳ルール:
 "Vampire Lord" → "血族の王"
 "Quest Giver" → "依頼人"
 
-{json_str}"""
+"""
+
+# 送信時に1行1項目を保つためにエスケープする文字（str.splitlines() が行の区切りとみなす文字をすべて含む）
+LINE_BREAK_ESCAPES = {'\\': '\\\\', '\n': '\\n', '\r': '\\r'}
+LINE_BREAK_ESCAPES.update(
+    (char, f'\\u{ord(char):04x}') for char in '\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+)
+LINE_BREAK_RE = re.compile('[' + re.escape(''.join(LINE_BREAK_ESCAPES)) + ']')
+
+# 翻訳結果の行に含まれるエスケープ（\\、\n、\r、\uXXXX）
+ESCAPE_RE = re.compile(r'\\(?:([\\nr])|u([0-9a-fA-F]{4}))')
+ESCAPED_CHARS = {'\\': '\\', 'n': '\n', 'r': '\r'}
+
+def escape_line_breaks(text: str) -> str:
+    """値の中の改行などを、1行に収まるエスケープ表記に変換する"""
+    return LINE_BREAK_RE.sub(lambda match: LINE_BREAK_ESCAPES[match.group()], text)
+
+def unescape_line_breaks(text: str) -> str:
+    """escape_line_breaks() で変換したエスケープ表記を元の文字に戻す"""
+    return ESCAPE_RE.sub(
+        lambda match: ESCAPED_CHARS[match.group(1)] if match.group(1) else chr(int(match.group(2), 16)),
+        text
+    )
+
+def parse_numbered_reply(reply: str, texts: List[str]) -> Optional[Dict[str, str]]:
+    """「番号. 翻訳文」の行を原文に対応付ける（番号がずれている応答なら None）
+
+    範囲外の番号・重複した番号・1番の欠落・番号付きの行の間にある番号の無い行は、番号のずれとみなす。
+    最後の項目の後に番号の無い行が続く場合は、その項目が複数行に分かれた可能性があるので結果に含めない。
+    """
+    translations = {}
+    seen = set()
+    last = None  # 直前の番号付きの行の項目
+    trailing = False  # 直前の番号付きの行の後に、番号の無い行があったか
+    # 改行は送信時にすべてエスケープしているので、\n だけで行に分ける（splitlines() は \r なども区切りにしてしまう）
+    for line in reply.split('\n'):
+        line = line.removesuffix('\r')
+        # 空行とコードブロックの囲み（```json や ```）は項目ではないので読み飛ばす
+        if not line.strip() or line.lstrip().startswith('```'):
+            continue
+        number, separator, translated_text = line.partition('.')
+        number = number.strip()
+        # isdigit() は '²' なども真になるので、ASCIIの数字だけを項目番号とする
+        if not (separator and number.isascii() and number.isdigit()):
+            if last is not None:
+                trailing = True
+            continue
+        index = int(number) - 1
+        if trailing or not 0 <= index < len(texts) or index in seen:
+            return None
+        seen.add(index)
+        last = texts[index]
+        # 区切りの空白1つだけを除き、値の前後の空白はそのまま残す
+        if translated_text.startswith(' '):
+            translated_text = translated_text[1:]
+        translations[last] = unescape_line_breaks(translated_text)
+    
+    if translations and 0 not in seen:
+        return None
+    if trailing:
+        translations.pop(last, None)
+    return translations
+
+class RateLimiter:
+    """トークンバケット方式でAPI呼び出し頻度を制限する（スレッドセーフ）"""
+    def __init__(self, requests_per_minute: int, burst: int = 1):
+        self.rate = requests_per_minute / 60.0  # 1秒あたりに補充されるトークン数
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """トークンを1つ取得できるまで待機"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class ModTranslator:
+    """JAR内のen_us.jsonをGeminiで翻訳し、ja_jp.jsonとして追加する（進捗を表示するには先に setup_logging() を呼ぶ）"""
+    def __init__(self, gemini_api_key: str, max_workers: int = 8, requests_per_minute: int = 60,
+                 cache_path: str = '.translate_cache.db', scan_cache_path: str = '.translate_scan_cache.json'):
+        self.api_key = gemini_api_key
+        # 新しいGemini SDKクライアントを初期化
+        # クライアントは1つだけ作り、並列のAPI呼び出しで接続プールを共有する
+        # （keep-aliveでTLSハンドシェイクを使い回し、h2があればHTTP/2で多重化する）
+        client_args = {
+            'http2': importlib.util.find_spec('h2') is not None,
+            'limits': httpx.Limits(max_connections=max_workers * 2, max_keepalive_connections=max_workers),
+        }
+        self.client = genai.Client(
+            api_key=gemini_api_key,
+            http_options=genai.types.HttpOptions(timeout=120_000, client_args=client_args)
+        )
+        self.max_workers = max_workers  # 同時に実行するAPI呼び出しの数
+        # APIのRPM制限を超えないようにする
+        self.rate_limiter = RateLimiter(requests_per_minute, burst=max_workers)
+        self.backed_up_jars = set()  # この実行中にバックアップ済みのJARパス
+        # 小さな言語ファイルをまとめて1回のAPI呼び出しで翻訳する際の上限
+        self.batch_token_limit = 4000  # 1バッチあたりの推定トークン数
+        self.batch_max_files = 20  # 1バッチあたりのファイル数
+        # 原文のSHA-256をキーにした翻訳キャッシュ（実行をまたいで保持される）
+        self.cache = shelve.open(cache_path)
+        # 処理済みJARの (mtime, サイズ) を記録し、次回の実行で変更のないJARを開かずにスキップする
+        self.scan_cache_path = scan_cache_path
+    
+    def close(self):
+        """翻訳キャッシュをディスクに書き出して閉じる"""
+        self.cache.close()
+    
+    def load_scan_cache(self) -> Dict[str, List[int]]:
+        """処理済みJARのキャッシュを読み込む"""
+        try:
+            with open(self.scan_cache_path, 'rb') as f:
+                scan_cache = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            # キャッシュが無い・壊れている場合は全JARを処理し直す
+            return {}
+        # JSONとしては正しくても形が違う場合は、キャッシュが無いものとして扱う
+        # （各エントリは jar_signature() の結果と == で比べるだけなので、形が違っても一致しないだけで済む）
+        return scan_cache if isinstance(scan_cache, dict) else {}
+    
+    def save_scan_cache(self, scan_cache: Dict[str, List[int]]):
+        """処理済みJARのキャッシュを保存"""
+        try:
+            with open(self.scan_cache_path, 'wb') as f:
+                f.write(orjson.dumps(scan_cache))
+        except OSError as e:
+            logger.warning(f"警告: 処理済みJARのキャッシュを保存できませんでした: {e}")
+    
+    def jar_signature(self, jar_path: str) -> List[int]:
+        """JARファイルの変更検出に使う (mtime, サイズ)"""
+        stat = os.stat(jar_path)
+        return [stat.st_mtime_ns, stat.st_size]
+    
+    def cache_key(self, text: str) -> str:
+        """翻訳キャッシュのキー（原文のSHA-256）"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def split_cached_translations(self, json_data: Dict) -> Tuple[Dict, Dict]:
+        """JSONデータをキャッシュ済みの翻訳と、APIで翻訳が必要な部分に分ける"""
+        cached = {}
+        pending = {}
+        for key, value in json_data.items():
+            if isinstance(value, str):
+                cache_key = self.cache_key(value)
+                if cache_key in self.cache:
+                    cached[key] = self.cache[cache_key]
+                    continue
+            pending[key] = value
+        return cached, pending
+    
+    def store_cached_translations(self, source: Dict, translated: Dict):
+        """APIで翻訳した文字列をキャッシュに保存"""
+        for key, value in source.items():
+            translated_value = translated.get(key)
+            if isinstance(value, str) and isinstance(translated_value, str):
+                self.cache[self.cache_key(value)] = translated_value
+    
+    def find_language_files_in_jar(self, jar_path: str) -> Optional[List[Dict]]:
+        """JARファイル内の未翻訳のen_us言語ファイルのみを検索する（読み込めなかった場合は None）"""
+        try:
+            # en_us.jsonのみを対象とし、翻訳に使うので内容も読み込む
+            # 既にja_jp.jsonがあるファイルは除外する（JARに同じ名前のエントリを重複して追加しないため）
+            return list(iter_lang_entries(jar_path, only_en_us=True, load_content=True, skip_translated=True))
+                            
+        except zipfile.BadZipFile:
+            logger.warning(f"警告: {jar_path} は有効なJARファイルではありません")
+        except Exception as e:
+            logger.error(f"エラー: {jar_path} の処理中にエラーが発生しました: {e}")
+        
+        return None
+    
+    def translate_json_with_gemini(self, json_data: Dict, source_lang: str = "English") -> Optional[Dict]:
+        """Gemini APIを使ってJSONデータを翻訳
+
+        キーやJSONの構造は送らず、値の文字列だけを番号付きリストで翻訳してから手元で組み立て直す
+        """
+        try:
+            # 翻訳対象の文字列（同じ文字列は1回だけ送る）
+            texts = list(dict.fromkeys(value for value in json_data.values() if isinstance(value, str)))
+            if not texts:
+                return dict(json_data)
+            
+            # 1行1項目にするため、値の中の改行などはエスケープし、元からあるバックスラッシュは \\ として送る
+            numbered_list = "\n".join(
+                f"{number}. {escape_line_breaks(text)}" for number, text in enumerate(texts, 1)
+            )
+            
+            # DarkRPG専用プロンプトを作成
+            prompt = PROMPT_HEADER + numbered_list
 
             # 新しいSDKを使用してAPI呼び出し
+            self.rate_limiter.acquire()
             response = self.client.models.generate_content(
                 model="gemini-2.0-flash-exp",
                 contents=prompt,
@@ -106,140 +258,340 @@ DarkRPG翻訳ルール:
             )
             
             if response.text:
-                translated_text = response.text
+                # 「番号. 翻訳文」の行を項目番号で原文に対応付ける
+                translations = parse_numbered_reply(response.text, texts)
+                if translations is None:
+                    # 番号がずれた応答の一部を採用すると、別の原文の翻訳がキャッシュに残り続けるので全体を捨てる
+                    logger.warning("翻訳結果の項目番号が送信した項目と対応していません")
+                    logger.warning(f"応答内容: {response.text[:500]}...")
+                    return None
                 
-                # 翻訳結果からJSONを抽出
-                try:
-                    # コードブロックがある場合は除去
-                    if '```json' in translated_text:
-                        start = translated_text.find('```json') + 7
-                        end = translated_text.find('```', start)
-                        if end != -1:
-                            translated_text = translated_text[start:end].strip()
-                    elif '```' in translated_text:
-                        start = translated_text.find('```') + 3
-                        end = translated_text.find('```', start)
-                        if end != -1:
-                            translated_text = translated_text[start:end].strip()
-                    
-                    # JSONとして解析
-                    translated_json = json.loads(translated_text)
-                    return translated_json
-                except json.JSONDecodeError as e:
-                    print(f"翻訳結果のJSON解析エラー: {e}")
-                    print(f"応答内容: {translated_text[:500]}...")
+                if not translations:
+                    logger.warning("翻訳結果から項目を読み取れませんでした")
+                    logger.warning(f"応答内容: {response.text[:500]}...")
                     return None
+                
+                # 元のキー順でJSONを組み立て直す（翻訳が返らなかったキーは含めず、呼び出し側で欠落を判定する）
+                translated_json = {}
+                for key, value in json_data.items():
+                    if not isinstance(value, str):
+                        translated_json[key] = value
+                    elif value in translations:
+                        translated_json[key] = translations[value]
+                return translated_json
             else:
-                print("APIからの応答が空です")
+                logger.warning("APIからの応答が空です")
                 return None
                 
         except Exception as e:
-            print(f"翻訳中にエラーが発生しました: {e}")
+            logger.error(f"翻訳中にエラーが発生しました: {e}")
             return None
     
-    def save_translated_json_to_jar(self, jar_path: str, original_lang_file: Dict, translated_content: Dict):
-        """翻訳されたJSONをJARファイル内の元の場所に追加"""
-        import tempfile
-        import shutil
+    def ensure_backup(self, jar_path: str):
+        """JARファイルへの最初の書き込み前に一度だけバックアップを作成"""
+        if jar_path in self.backed_up_jars:
+            return
+        
+        backup_path = jar_path + '.backup'
+        if not os.path.exists(backup_path):
+            shutil.copy2(jar_path, backup_path)
+            logger.info(f"    バックアップを作成: {backup_path}")
+        self.backed_up_jars.add(jar_path)
+    
+    def translate_json_batch_with_gemini(self, items: List[Tuple[str, Dict]], source_lang: str = "English") -> Optional[Dict[str, Dict]]:
+        """複数のJSONデータを1回のAPI呼び出しでまとめて翻訳
+
+        items は (識別子, JSONデータ) のリストで、識別子をキーとした翻訳結果を返す
+        """
+        # (識別子, キー) の組をキーにして1つのJSONにまとめる
+        combined = {
+            (item_id, key): value
+            for item_id, json_data in items
+            for key, value in json_data.items()
+        }
+        translated_json = self.translate_json_with_gemini(combined, source_lang)
+        if translated_json is None:
+            return None
+        
+        results = {item_id: {} for item_id, _ in items}
+        for (item_id, key), value in translated_json.items():
+            results[item_id][key] = value
+        return results
+    
+    def estimate_tokens(self, json_data: Dict) -> int:
+        """JSONデータのおおよそのトークン数を見積もる"""
+        return len(orjson.dumps(json_data, option=orjson.OPT_NON_STR_KEYS)) // 4
+    
+    def split_json_for_batches(self, json_data: Dict) -> List[Dict]:
+        """1バッチの推定トークン数の上限を超えるJSONデータを、上限以内の部分に分ける"""
+        if self.estimate_tokens(json_data) <= self.batch_token_limit:
+            return [json_data]
+        
+        # 1回の応答に収まらず途中で切れるのを防ぐため、項目単位で分割する
+        parts = []
+        current = {}
+        current_tokens = 0
+        for key, value in json_data.items():
+            tokens = self.estimate_tokens({key: value})
+            if current and current_tokens + tokens > self.batch_token_limit:
+                parts.append(current)
+                current = {}
+                current_tokens = 0
+            current[key] = value
+            current_tokens += tokens
+        
+        if current:
+            parts.append(current)
+        return parts
+    
+    def build_translation_batches(self, indices: List[int], contents: List[Dict]) -> List[List[Tuple[int, Dict]]]:
+        """翻訳タスクをAPI呼び出し単位のバッチ（(タスク番号, JSONデータの一部) のリスト）に分ける"""
+        batches = []
+        current = []
+        current_tokens = 0
         
-        # 元のパスからja_jp.jsonのパスを生成
-        original_path = original_lang_file['path']
-        ja_jp_path = original_path.replace('en_us.json', 'ja_jp.json')
+        for index in indices:
+            for part in self.split_json_for_batches(contents[index]):
+                tokens = self.estimate_tokens(part)
+                if current and (current_tokens + tokens > self.batch_token_limit
+                                or len(current) >= self.batch_max_files):
+                    batches.append(current)
+                    current = []
+                    current_tokens = 0
+                current.append((index, part))
+                current_tokens += tokens
         
+        if current:
+            batches.append(current)
+        return batches
+    
+    def save_translated_batch_to_jar(self, jar_path: str, entries: List[Tuple[str, Dict, int]]) -> bool:
+        """翻訳されたJSON群を1回の追記でJARファイル内に追加
+
+        entries は (ja_jp.jsonのパス, 翻訳済みJSON, 圧縮方式) のリストで、
+        圧縮方式には読み込み時に記録した元のen_us.jsonのものを使う（書き込み時にJARを走査し直さない）
+        """
+        # 読み込み（r）と書き込み（a）は別々に開く。追記モードは閉じるまでセントラルディレクトリが
+        # 書き換わった状態になるため、翻訳のAPI呼び出しの間ずっと開いたままにすると中断時にJARが壊れる。
+        # また、ZIPでないファイルを追記モードで開くと末尾に空のZIPが書き足されてしまう
         try:
-            # 一時ディレクトリを作成
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_jar_path = os.path.join(temp_dir, 'temp.jar')
-                
-                # 元のJARファイルを一時ファイルにコピー
-                shutil.copy2(jar_path, temp_jar_path)
-                
-                # JARファイルを読み書きモードで開く
-                with zipfile.ZipFile(temp_jar_path, 'a') as jar:
-                    # 翻訳されたJSONを文字列として準備
-                    translated_json_str = json.dumps(translated_content, ensure_ascii=False, indent=2)
+            self.ensure_backup(jar_path)
+            
+            # 追記モードなら新しいエントリだけが末尾に書き込まれるので、JAR全体をコピーする必要はない
+            # 同じJARのエントリはまとめて書き込み、セントラルディレクトリの再書き込みを1回にする
+            # （ZipFileはZIP64が既定で有効なので、2GBを超えるJARでも特別な指定なしに追記できる）
+            with zipfile.ZipFile(jar_path, 'a') as jar:
+                for ja_jp_path, translated_content, compress_type in entries:
+                    # 翻訳されたJSONをUTF-8のバイト列として準備
+                    translated_json_bytes = orjson.dumps(translated_content, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
                     
                     # JARファイルに新しいファイルを追加
-                    jar.writestr(ja_jp_path, translated_json_str.encode('utf-8'))
-                
-                # バックアップを作成
-                backup_path = jar_path + '.backup'
-                if not os.path.exists(backup_path):
-                    shutil.copy2(jar_path, backup_path)
-                    print(f"    バックアップを作成: {backup_path}")
-                
-                # 更新されたJARファイルを元の場所に移動
-                shutil.move(temp_jar_path, jar_path)
-                
-            print(f"    翻訳済みファイルをJAR内に追加: {ja_jp_path}")
+                    # 小さなテキストなので圧縮レベル1で十分（レベル6より高速）
+                    jar.writestr(ja_jp_path, translated_json_bytes, compress_type=compress_type, compresslevel=1)
+                    logger.info(f"    翻訳済みファイルをJAR内に追加: {ja_jp_path}")
+            
             return True
             
         except Exception as e:
-            print(f"    JARファイル更新エラー: {e}")
+            logger.error(f"    JARファイル更新エラー: {e}")
             return False
     
     def translate_mod_files(self, directory_path: str):
         """指定ディレクトリ内のMODファイルを翻訳"""
-        directory = Path(directory_path)
-        
-        if not directory.exists():
-            print(f"エラー: ディレクトリ {directory_path} が存在しません")
+        if not os.path.exists(directory_path):
+            logger.error(f"エラー: ディレクトリ {directory_path} が存在しません")
             return
         
-        jar_files = list(directory.glob("*.jar"))
+        jar_files = list_jar_files(directory_path)
         
         if not jar_files:
-            print(f"警告: {directory_path} にJARファイルが見つかりません")
+            logger.warning(f"警告: {directory_path} にJARファイルが見つかりません")
             return
         
-        print(f"{len(jar_files)}個のJARファイルからen_us.jsonを処理します")
-        print("="*60)
+        logger.info(f"{len(jar_files)}個のJARファイルからen_us.jsonを処理します")
+        logger.info("="*60)
         
-        total_files = 0
-        successful_translations = 0
+        # 前回の実行以降に変更のないJARは開かずにスキップ
+        scan_cache = self.load_scan_cache()
+        processed_jars = {}
         
+        # 先に全JARを走査して翻訳タスクを作成
+        tasks = []
         for jar_file in jar_files:
-            print(f"\n処理中: {jar_file.name}")
-            language_files = self.find_language_files_in_jar(str(jar_file))
+            logger.info(f"\n処理中: {os.path.basename(jar_file)}")
+            signature = self.jar_signature(jar_file)
+            if scan_cache.get(jar_file) == signature:
+                logger.info("  前回の処理から変更がありません - スキップ")
+                processed_jars[jar_file] = signature
+                continue
+            
+            language_files = self.find_language_files_in_jar(jar_file)
             
+            if language_files is None:
+                # 読み込めなかったJARは記録せず、次回も処理し直す
+                continue
             if not language_files:
-                print("  en_us.jsonファイルが見つかりません - スキップ")
+                logger.info("  未翻訳のen_us.jsonファイルが見つかりません - スキップ")
+                processed_jars[jar_file] = signature
                 continue
             
-            print(f"  {len(language_files)}個のen_us.jsonファイルを発見")
-            
-            for lang_file in language_files:
-                total_files += 1
-                print(f"  翻訳中: {lang_file['path']} (en_us → ja_jp)")
-                
-                # 翻訳実行（英語から日本語）
-                translated_content = self.translate_json_with_gemini(
-                    lang_file['content'], 
-                    "English"
-                )
-                
-                if translated_content:
-                    # 翻訳済みファイルをJARファイル内に保存
-                    if self.save_translated_json_to_jar(str(jar_file), lang_file, translated_content):
-                        successful_translations += 1
-                        print(f"    ✓ 翻訳完了")
+            logger.info(f"  {len(language_files)}個のen_us.jsonファイルを発見")
+            tasks.extend((jar_file, lang_file) for lang_file in language_files)
+        
+        total_files = len(tasks)
+        # JARごとの未完了タスク数と翻訳結果（JAR単位でまとめて保存する）
+        remaining = Counter(jar_path for jar_path, _ in tasks)
+        files_per_jar = Counter(remaining)
+        translated_by_jar = defaultdict(list)
+        
+        # キャッシュ済みの文字列は再翻訳せず、未翻訳の部分だけをAPIに送る
+        cached_parts = []
+        pending_parts = []
+        for _, lang_file in tasks:
+            cached, pending = self.split_cached_translations(lang_file['content'])
+            cached_parts.append(cached)
+            pending_parts.append(pending)
+        pending_indices = [index for index, pending in enumerate(pending_parts) if pending]
+        
+        # 同じJARのファイルが隣り合う順序のまま、小さなファイルはまとめ、大きなファイルは分割してバッチにする
+        batches = self.build_translation_batches(pending_indices, pending_parts)
+        # 分割したファイルは、すべての部分の翻訳が揃ってから処理する
+        parts_left = Counter(index for batch in batches for index, _ in batch)
+        translated_parts = {}
+        
+        logger.info(f"\n{total_files}個のファイルを{len(batches)}回のAPI呼び出しで翻訳します（最大{self.max_workers}並列, en_us → ja_jp）")
+        logger.info(f"キャッシュのみで翻訳できるファイル数: {total_files - len(pending_indices)}")
+        
+        done_count = 0
+        # 翻訳の完了したJARを書き込みスレッドに渡すキュー（書き込みが詰まったら結果の処理を待たせる）
+        write_queue = queue.Queue(maxsize=self.max_workers)
+        saved_counts = []  # 書き込みスレッドが保存できたファイル数
+        
+        def jar_writer():
+            """JAR単位の保存を順に行う（API呼び出しと並行してディスクに書き込む）"""
+            while True:
+                job = write_queue.get()
+                if job is None:
+                    return
+                jar_path, entries = job
+                try:
+                    if self.save_translated_batch_to_jar(jar_path, entries):
+                        saved_counts.append(len(entries))
+                        # すべてのファイルのすべての項目を翻訳できたJARだけを処理済みとして記録する
+                        # （項目が欠けたファイルはentriesに含まれないので、次回はそのファイルの欠けた項目だけを翻訳し直す）
+                        if len(entries) == files_per_jar[jar_path]:
+                            processed_jars[jar_path] = self.jar_signature(jar_path)
                     else:
-                        print(f"    ✗ 保存失敗")
+                        logger.warning(f"    ✗ 保存失敗: {os.path.basename(jar_path)}")
+                except Exception as e:
+                    logger.error(f"    JARファイル更新エラー: {e}")
+        
+        def complete(index: int, translated_pending: Optional[Dict]):
+            """1ファイル分の翻訳結果を処理し、JARの翻訳がすべて終わったら書き込みスレッドに渡す"""
+            nonlocal done_count
+            jar_path, lang_file = tasks[index]
+            jar_name = os.path.basename(jar_path)
+            # 総数は事前に確定しているので、進捗はカウンタだけで表示できる
+            done_count += 1
+            progress = f"[{done_count}/{total_files}]"
+            
+            translated_content = None
+            if translated_pending is not None:
+                # 返ってきた翻訳だけをキャッシュする（欠けた項目は次回の実行でその分だけ翻訳し直す）
+                self.store_cached_translations(pending_parts[index], translated_pending)
+                missing_count = sum(1 for key in pending_parts[index] if key not in translated_pending)
+                if missing_count:
+                    # 出力トークン上限で応答が途切れた場合など。一部だけのja_jp.jsonは書き込まない
+                    logger.warning(f"  翻訳結果に {missing_count}個の項目が含まれていません: {jar_name} - {lang_file['path']}")
                 else:
-                    print(f"    ✗ 翻訳失敗")
+                    # キャッシュ済みの翻訳とAPIの翻訳を元のキー順でまとめる
+                    cached = cached_parts[index]
+                    translated_content = {
+                        key: cached[key] if key in cached else translated_pending[key]
+                        for key in lang_file['content']
+                    }
+            
+            # 中身が空の en_us.json（{}）も空の ja_jp.json を書き込んで完了とし、JARを処理済みとして記録する
+            if translated_content is not None:
+                logger.info(f"  {progress} ✓ 翻訳完了: {jar_name} - {lang_file['path']}")
+                # 元のパスからja_jp.jsonのパスを生成
+                translated_by_jar[jar_path].append((sibling_ja_jp_path(lang_file['path']), translated_content, lang_file['compress_type']))
+            else:
+                logger.warning(f"  {progress} ✗ 翻訳失敗: {jar_name} - {lang_file['path']}")
+            
+            remaining[jar_path] -= 1
+            if remaining[jar_path] == 0:
+                # このJARの翻訳がすべて終わったら、まとめて保存するよう書き込みスレッドに渡す
+                entries = translated_by_jar.pop(jar_path, [])
+                if entries:
+                    write_queue.put((jar_path, entries))
+        
+        # 翻訳ワーカー（スレッドプール）と書き込みスレッドのパイプラインで、通信とディスク書き込みを重ねる
+        writer = threading.Thread(target=jar_writer, name='jar-writer')
+        writer.start()
+        try:
+            # キャッシュだけで翻訳できたファイルはAPIを呼ばずに処理
+            for index, pending in enumerate(pending_parts):
+                if not pending:
+                    complete(index, {})
+            
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {
+                    executor.submit(
+                        self.translate_json_batch_with_gemini,
+                        [(str(position), part) for position, (_, part) in enumerate(batch)],
+                        "English"
+                    ): batch
+                    for batch in batches
+                }
                 
-                # API制限を避けるための遅延
-                if total_files < sum(len(self.find_language_files_in_jar(str(jf))) for jf in jar_files):
-                    print(f"    {self.translation_delay}秒待機中...")
-                    time.sleep(self.translation_delay)
+                for future in as_completed(futures):
+                    translated_batch = future.result() or {}
+                    for position, (index, _) in enumerate(futures[future]):
+                        translated_part = translated_batch.get(str(position))
+                        if translated_part is not None:
+                            translated_parts.setdefault(index, {}).update(translated_part)
+                        parts_left[index] -= 1
+                        if parts_left[index] == 0:
+                            # 一部の呼び出しだけが失敗した場合は、欠けた項目として complete() で扱う
+                            complete(index, translated_parts.pop(index, None))
+        finally:
+            # 残っている書き込みをすべて終えてから集計する
+            write_queue.put(None)
+            writer.join()
+        
+        successful_translations = sum(saved_counts)
+        self.save_scan_cache(processed_jars)
         
-        print("\n" + "="*60)
-        print("翻訳完了!")
-        print(f"処理したファイル数: {total_files}")
-        print(f"成功した翻訳数: {successful_translations}")
-        print(f"失敗した翻訳数: {total_files - successful_translations}")
-        print(f"翻訳済みファイルは各JARファイル内に ja_jp.json として追加されました")
-        print(f"元のJARファイルは .backup として保存されています")
+        logger.info("\n" + "="*60)
+        logger.info("翻訳完了!")
+        logger.info(f"処理したファイル数: {total_files}")
+        logger.info(f"成功した翻訳数: {successful_translations}")
+        logger.info(f"失敗した翻訳数: {total_files - successful_translations}")
+        logger.info(f"翻訳済みファイルは各JARファイル内に ja_jp.json として追加されました")
+        logger.info(f"元のJARファイルは .backup として保存されています")
+
+def setup_logging() -> Optional[QueueListener]:
+    """ログをキュー経由で受け取り、バックグラウンドのスレッドから標準エラー出力に書き出す
+
+    ModTranslator の進捗はINFOレベルで出力されるので、main() を使わない場合も先に呼び出しておく。
+    既にハンドラが設定されている場合は何もせず None を返す（2回呼んでも同じ行が重複して出力されない）。
+    """
+    if logger.handlers:
+        return None
+    
+    log_queue = queue.Queue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    
+    # 並列の翻訳ワーカーは端末への書き込みを待たずにキューへ積むだけで済む
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    return listener
 
 def main():
     print("MOD翻訳ツール（Gemini API版）")
@@ -265,8 +617,14 @@ def main():
         return
     
     # 翻訳実行
+    listener = setup_logging()
     translator = ModTranslator(api_key)
-    translator.translate_mod_files(directory)
+    try:
+        translator.translate_mod_files(directory)
+    finally:
+        translator.close()
+        if listener is not None:
+            listener.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file